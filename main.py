@@ -1,6 +1,18 @@
 import sys
 import pandas as pd
+import numpy as np
 import os
+import gc
+import io
+import re
+import mmap
+import struct
+import time
+import hashlib
+import tempfile
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton,
     QFileDialog, QLabel, QGridLayout, QHBoxLayout
@@ -13,6 +25,515 @@ DEV_MODE = True  # 開發模式，不啟用 Serial
 SERIAL_PORT_SOURCE = '/dev/ttyUSB0'
 SERIAL_PORT_DEST = '/dev/ttyUSB1'
 BAUDRATE = 9600
+PUBLISH_SHARED_STATE = True  # Publish live plate state to shared memory for local consumers
+SHARED_STATE_PATH = '/dev/shm/microplate_state'
+PROTOCOL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'microplate')
+PROTOCOL_CACHE_VERSION = 1  # Bump when the compiled protocol format changes
+
+# Plate layouts: plate type -> (rows, cols)
+PLATE_LAYOUTS = {"384": (16, 24), "96": (8, 12), "48": (6, 8), "24": (4, 6)}
+# Center-to-center well spacing in mm
+PLATE_WELL_SPACING_MM = {"384": 4.50, "96": 9.0, "48": 13.0, "24": 19.0}
+WELL_PATTERN = re.compile(r'^([A-Z])(\d{2,})$')
+
+# Shared plate state layout (little-endian, 128 bytes):
+#   0  magic 'MPLS'       4  version u16        6  plate type u16 (384/96/48/24)
+#   8  rows u16          10  cols u16          12  mode u16 (0 = protocol steps, 1 = all light)
+#  14  steps shown u16   16  sequence u64 (odd while being written)
+#  24  step u32 (1-based, 0 = none)            28  total steps u32
+#  32  source bitmask (48 bytes)               80  destination bitmask (48 bytes)
+#  Bit (row * cols + col) is set for a lit well, row/col zero-based
+#  The sequence counter is a best-effort seqlock: Python mmap writes have no memory
+#  barriers, so on weakly ordered CPUs (e.g. the Pi 5's ARM64 cores) a reader may rarely
+#  see the sequence and payload updates out of order. Consumers needing strict
+#  consistency should compare two consecutive reads.
+SHARED_STATE_MAGIC = b'MPLS'
+SHARED_STATE_VERSION = 1
+SHARED_STATE_HEADER = struct.Struct('<4sHHHHHH')
+SHARED_STATE_SEQUENCE = struct.Struct('<Q')
+SHARED_STATE_STEP = struct.Struct('<II')
+SHARED_STATE_MASK_BYTES = 48  # 384 wells
+SHARED_STATE_SIZE = 128
+SHARED_STATE_MODE_STEPS = 0
+SHARED_STATE_MODE_ALL_LIGHT = 1
+
+# Usage heatmap: number of intensity levels and full-intensity color per well role
+HEAT_LEVELS = 5
+HEAT_COLORS = {"source": (255, 0, 0), "destination": (0, 255, 0), "both": (255, 170, 0)}
+
+def standardize_well_format(well):
+    """Standardize well format to A01 form"""
+    well = well.strip()
+    if len(well) >= 2:
+        row = well[0].upper()
+        col = well[1:]
+        try:
+            col_num = int(col)
+            return f"{row}{col_num:02d}"
+        except ValueError:
+            return well
+    return well
+
+def convert_step_format(raw_data):
+    """Convert Step format CSV to internal format"""
+    converted_data = []
+    
+    # Group by Step
+    for step in sorted(raw_data['Step'].unique()):
+        step_data = raw_data[raw_data['Step'] == step]
+        
+        # Collect all Source and Destination for this step
+        sources = []
+        destinations = []
+        
+        for _, row in step_data.iterrows():
+            # Standardize well format (ensure two digits)
+            source = standardize_well_format(str(row['Source']))
+            sources.append(source)
+            
+            if 'Destination' in raw_data.columns and pd.notna(row['Destination']):
+                dest = standardize_well_format(str(row['Destination']))
+                destinations.append(dest)
+            else:
+                destinations.append(source)  # If no destination, use source
+        
+        # Connect multiple wells with semicolons
+        source_str = ';'.join(sources)
+        dest_str = ';'.join(destinations)
+        
+        converted_data.append({
+            'Source_well': source_str,
+            'Destination_well': dest_str
+        })
+    
+    return pd.DataFrame(converted_data)
+
+def load_protocol(file_path, cache_dir=PROTOCOL_CACHE_DIR):
+    """Load a protocol CSV into internal format, using the compiled protocol cache"""
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    
+    # Cache is keyed by file content, so staged copies of the same file share an entry
+    key = hashlib.sha1(content).hexdigest()
+    cache_path = os.path.join(cache_dir, f"v{PROTOCOL_CACHE_VERSION}-{key}.pkl")
+    if os.path.exists(cache_path):
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception:
+            pass  # Corrupt or incompatible cache entry, rebuild it
+    
+    raw_data = pd.read_csv(io.BytesIO(content))
+    
+    # Check CSV format and convert
+    if 'Step' in raw_data.columns:
+        # New format: group by Step
+        data = convert_step_format(raw_data)
+    else:
+        # Old format: use directly
+        data = raw_data
+    
+    # Write to a temporary file and rename it into place, so concurrent loaders
+    # (parallel lint workers, the GUI) never read a half-written entry
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                data.to_pickle(f)
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except OSError:
+        pass  # Cache is best effort (e.g. read-only home directory)
+    return data
+
+def split_step_wells(data):
+    """Split each step's semicolon-separated wells into (source list, destination list)"""
+    has_dest = 'Destination_well' in data.columns
+    steps = []
+    for i in range(len(data)):
+        src_wells = [w.strip() for w in str(data.at[i, 'Source_well']).split(';') if w.strip()]
+        if has_dest:
+            dest_wells = [w.strip() for w in str(data.at[i, 'Destination_well']).split(';') if w.strip()]
+        else:
+            dest_wells = src_wells  # If no destination, use source
+        steps.append((src_wells, dest_wells))
+    return steps
+
+def parse_well(well):
+    """Parse an A01-form well name to a zero-based (row, col) position, or None if invalid"""
+    match = WELL_PATTERN.match(well)
+    if not match or int(match.group(2)) < 1:
+        return None
+    return ord(match.group(1)) - 65, int(match.group(2)) - 1
+
+def infer_plate_type(positions):
+    """Get the smallest plate type that contains all (row, col) positions"""
+    positions = list(positions)  # Checked once per plate type
+    for plate_type in ["24", "48", "96", "384"]:
+        rows, cols = PLATE_LAYOUTS[plate_type]
+        if all(r < rows and 0 <= c < cols for r, c in positions):
+            return plate_type
+    return "384"
+
+def lint_protocol(file_path, plate_type=None, cache_dir=PROTOCOL_CACHE_DIR):
+    """Check a protocol CSV and return a summary dict with any errors found"""
+    result = {
+        'file': file_path,
+        'plate_type': plate_type,
+        'steps': 0,
+        'max_wells': 0,
+        'errors': [],
+    }
+    try:
+        data = load_protocol(file_path, cache_dir)
+    except Exception as e:
+        result['errors'].append(f"cannot parse: {e}")
+        return result
+    
+    if 'Source_well' not in data.columns:
+        result['errors'].append("missing Step/Source columns")
+        return result
+    
+    wells = set()
+    for i, (src_wells, dest_wells) in enumerate(split_step_wells(data)):
+        if not src_wells:
+            result['errors'].append(f"step {i + 1}: no source wells")
+        result['max_wells'] = max(result['max_wells'], len(src_wells))
+        for well in src_wells + dest_wells:
+            wells.add((i + 1, well))
+    result['steps'] = len(data)
+    
+    # Parse well names to (row, col) positions
+    positions = {}
+    for step, well in sorted(wells):
+        position = parse_well(well)
+        if position:
+            positions[well] = position
+        else:
+            result['errors'].append(f"step {step}: invalid well '{well}'")
+    
+    # Without an explicit plate type, check against the smallest plate that fits
+    if plate_type is None:
+        plate_type = infer_plate_type(positions.values())
+    result['plate_type'] = plate_type
+    
+    rows, cols = PLATE_LAYOUTS[plate_type]
+    for step, well in sorted(wells):
+        if well in positions:
+            r, c = positions[well]
+            if r >= rows or c >= cols:
+                result['errors'].append(f"step {step}: well {well} outside {plate_type}-well plate")
+    return result
+
+def lint_directory(directory, plate_type=None, jobs=None, cache_dir=PROTOCOL_CACHE_DIR):
+    """Lint all protocol CSVs in a directory in parallel, returning results sorted by file name"""
+    files = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith('.csv')
+    )
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(
+            lint_protocol, files,
+            [plate_type] * len(files), [cache_dir] * len(files)
+        ))
+
+def check_paired_steps(steps):
+    """Raise ValueError for steps whose source and destination well counts differ
+
+    Optimizing and exporting pair the n-th source with the n-th destination; unpaired
+    wells (possible in old-format CSVs) would otherwise be dropped silently.
+    """
+    for i, (src_wells, dest_wells) in enumerate(steps):
+        if len(src_wells) != len(dest_wells):
+            raise ValueError(f"step {i + 1}: {len(src_wells)} source wells but "
+                             f"{len(dest_wells)} destination wells")
+
+def step_well_matrix(steps, plate_type):
+    """Build a steps × (2 × wells) 0/1 matrix of lit wells, source panel then destination panel
+
+    Source and destination are separate panels, so a well moving from one to the other
+    counts as two changes.
+    """
+    rows, cols = PLATE_LAYOUTS[plate_type]
+    lit = np.zeros((len(steps), 2 * rows * cols), dtype=np.uint8)
+    for i, (src_wells, dest_wells) in enumerate(steps):
+        for offset, wells in ((0, src_wells), (rows * cols, dest_wells)):
+            for well in wells:
+                position = parse_well(well)
+                if position is None or position[0] >= rows or position[1] >= cols:
+                    raise ValueError(f"step {i + 1}: well {well} is not on a {plate_type}-well plate")
+                lit[i, offset + position[0] * cols + position[1]] = 1
+    return lit
+
+def step_dependencies(steps):
+    """Get, for each step, the earlier steps it must stay after
+
+    A step depends on an earlier step when one of them writes (is the destination of a
+    transfer into) a well that the other reads or writes.
+    """
+    last_writer = {}
+    readers = {}  # Well -> steps that read it since its last write
+    preds = []
+    for i, (src_wells, dest_wells) in enumerate(steps):
+        reads = set(src_wells)
+        writes = {d for s, d in zip(src_wells, dest_wells) if s != d}
+        step_preds = set()
+        for well in reads | writes:
+            if well in last_writer:
+                step_preds.add(last_writer[well])
+        for well in writes:
+            step_preds.update(readers.get(well, ()))
+        for well in reads:
+            readers.setdefault(well, []).append(i)
+        for well in writes:
+            last_writer[well] = i
+            readers[well] = []
+        step_preds.discard(i)
+        preds.append(step_preds)
+    return preds
+
+def step_centroids(lit, plate_type):
+    """Get the (x, y) centroid in mm of each step's lit wells (either panel), relative to well A1"""
+    rows, cols = PLATE_LAYOUTS[plate_type]
+    lit = lit[:, :rows * cols] | lit[:, rows * cols:]
+    rows_idx, cols_idx = np.divmod(np.arange(rows * cols), cols)
+    counts = np.maximum(lit.sum(axis=1, dtype=np.int32), 1)
+    positions = np.stack([lit @ cols_idx, lit @ rows_idx], axis=1)
+    return positions * PLATE_WELL_SPACING_MM[plate_type] / counts[:, None]
+
+def transition_costs(lit, order, plate_type):
+    """Get total changed panel wells and total centroid travel (mm) between consecutive steps"""
+    lit = lit[order]
+    changed = int((lit[1:] != lit[:-1]).sum())
+    travel = float(np.linalg.norm(np.diff(step_centroids(lit, plate_type), axis=0), axis=1).sum())
+    return changed, travel
+
+def optimize_step_order(data, plate_type, distance_weight=None):
+    """Reorder independent protocol steps to minimize changes between consecutive steps
+
+    Greedy nearest-neighbour ordering over the step dependency graph: from the current
+    step, the next step is the ready step with the lowest cost, where cost is the number
+    of source and destination panel wells that change state plus distance_weight ×
+    centroid travel in mm. The default weight makes one well pitch of travel cost the
+    same as one changed well.
+    Returns the reordered DataFrame and the new order (original step indices).
+    Raises ValueError for wells off the plate or unpaired source/destination wells.
+    """
+    steps = split_step_wells(data)
+    check_paired_steps(steps)
+    n = len(steps)
+    if distance_weight is None:
+        distance_weight = 1.0 / PLATE_WELL_SPACING_MM[plate_type]
+    
+    lit = step_well_matrix(steps, plate_type)
+    counts = lit.sum(axis=1, dtype=np.int32)
+    centroids = step_centroids(lit, plate_type)
+    
+    preds = step_dependencies(steps)
+    successors = [[] for _ in range(n)]
+    indegree = np.zeros(n, dtype=np.int32)
+    for i, step_preds in enumerate(preds):
+        indegree[i] = len(step_preds)
+        for p in step_preds:
+            successors[p].append(i)
+    
+    # Costs are evaluated over a pool of unscheduled steps kept in original order (so ties
+    # keep the protocol order); steps that are not ready carry an infinite penalty. The
+    # pool is compacted once half of it has been scheduled, and its well matrix is stored
+    # column-major so gathering the current step's lit wells reads contiguous columns.
+    blocked = np.where(indegree == 0, 0.0, np.inf)
+    scheduled = np.zeros(n, dtype=bool)
+    order = []
+    current = None
+    pool = None
+    for _ in range(n):
+        if pool is None or 2 * pool_done >= len(pool):
+            pool = np.flatnonzero(~scheduled)
+            pool_pos = np.full(n, -1)
+            pool_pos[pool] = np.arange(len(pool))
+            pool_lit = np.asfortranarray(lit[pool])
+            pool_counts = counts[pool].astype(float)
+            pool_x, pool_y = centroids[pool, 0], centroids[pool, 1]
+            pool_blocked = blocked[pool]
+            pool_done = 0
+        
+        if current is None:
+            best_pos = np.argmin(pool_blocked)
+        else:
+            lit_wells = np.flatnonzero(lit[current])
+            overlap = pool_lit[:, lit_wells].sum(axis=1, dtype=np.int32)
+            travel = np.hypot(pool_x - centroids[current, 0], pool_y - centroids[current, 1])
+            # Changed wells = counts[candidate] + counts[current] - 2 * overlap; the current
+            # step's count is the same for every candidate so it is left out
+            cost = pool_counts - 2 * overlap + distance_weight * travel + pool_blocked
+            best_pos = np.argmin(cost)
+        best = int(pool[best_pos])
+        order.append(best)
+        scheduled[best] = True
+        blocked[best] = np.inf
+        pool_blocked[best_pos] = np.inf
+        pool_done += 1
+        for s in successors[best]:
+            indegree[s] -= 1
+            if indegree[s] == 0:
+                blocked[s] = 0.0
+                pool_blocked[pool_pos[s]] = 0.0
+        current = best
+    
+    return data.iloc[order].reset_index(drop=True), order
+
+def export_protocol(data, file_path):
+    """Write a protocol in internal format back out as a Step,Source[,Destination] CSV"""
+    steps = split_step_wells(data)
+    check_paired_steps(steps)
+    # Source-only protocols (destination always equal to source) are written without Destination
+    has_dest = any(src_wells != dest_wells for src_wells, dest_wells in steps)
+    records = []
+    for step, (src_wells, dest_wells) in enumerate(steps, start=1):
+        for source, dest in zip(src_wells, dest_wells):
+            if has_dest:
+                records.append({'Step': step, 'Source': source, 'Destination': dest})
+            else:
+                records.append({'Step': step, 'Source': source})
+    pd.DataFrame(records).to_csv(file_path, index=False)
+
+class WellUsage:
+    """Per-well source and destination counts over a whole protocol, updated incrementally"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Clear all counts (e.g. when a different protocol is loaded)"""
+        self.source_counts = pd.Series(dtype=np.int64)
+        self.destination_counts = pd.Series(dtype=np.int64)
+        self.steps = 0
+
+    def update(self, data):
+        """Count wells of the steps appended to data since the last update"""
+        new_steps = data.iloc[self.steps:]
+        if new_steps.empty:
+            return
+        
+        sources = new_steps['Source_well'].astype(str).tolist()
+        if 'Destination_well' in new_steps.columns:
+            destinations = new_steps['Destination_well'].astype(str).tolist()
+        else:
+            destinations = sources  # If no destination, use source
+        
+        # Split all steps in one pass instead of step by step
+        src_wells = np.array(';'.join(sources).replace(' ', '').split(';'), dtype=object)
+        dest_wells = np.array(';'.join(destinations).replace(' ', '').split(';'), dtype=object)
+        
+        # When every step pairs sources with destinations, a well transferred onto
+        # itself only counts as a source
+        if all(s.count(';') == d.count(';') for s, d in zip(sources, destinations)):
+            dest_wells = dest_wells[dest_wells != src_wells]
+        
+        src_counts = pd.Series(src_wells[src_wells != ''], dtype=object).value_counts()
+        dest_counts = pd.Series(dest_wells[dest_wells != ''], dtype=object).value_counts()
+        self.source_counts = self.source_counts.add(src_counts, fill_value=0).astype(np.int64)
+        self.destination_counts = self.destination_counts.add(dest_counts, fill_value=0).astype(np.int64)
+        self.steps = len(data)
+
+class PlateStatePublisher:
+    """Publish the lit-well state into a memory-mapped file, guarded by a sequence counter
+
+    Readers map the same file and retry while the sequence is odd or changes during a read
+    (see read_plate_state).
+    """
+
+    def __init__(self, path=SHARED_STATE_PATH):
+        self.path = path
+        # Reuse an existing region without truncating it, so consumers that still have it
+        # mapped keep valid memory across application restarts
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != SHARED_STATE_SIZE:
+                os.ftruncate(fd, SHARED_STATE_SIZE)
+            self.mm = mmap.mmap(fd, SHARED_STATE_SIZE)
+        finally:
+            os.close(fd)
+        
+        # Continue from the existing sequence so it never goes backwards; an odd value
+        # (previous writer died mid-update) is rounded up so the next write starts odd
+        self.sequence, = SHARED_STATE_SEQUENCE.unpack_from(self.mm, 16)
+        self.sequence += self.sequence % 2
+
+    def publish(self, plate_type, step, total_steps, source_wells, dest_wells,
+                mode=SHARED_STATE_MODE_STEPS, steps_shown=1):
+        """Write a new plate state (wells in A01 form)"""
+        rows, cols = PLATE_LAYOUTS[plate_type]
+        source_mask = 0
+        for well in source_wells:
+            position = parse_well(well)
+            if position:
+                source_mask |= 1 << (position[0] * cols + position[1])
+        dest_mask = 0
+        for well in dest_wells:
+            position = parse_well(well)
+            if position:
+                dest_mask |= 1 << (position[0] * cols + position[1])
+        
+        self.sequence += 1  # Odd: write in progress
+        SHARED_STATE_SEQUENCE.pack_into(self.mm, 16, self.sequence)
+        SHARED_STATE_HEADER.pack_into(self.mm, 0, SHARED_STATE_MAGIC, SHARED_STATE_VERSION,
+                                      int(plate_type), rows, cols, mode, steps_shown)
+        SHARED_STATE_STEP.pack_into(self.mm, 24, step, total_steps)
+        self.mm[32:80] = source_mask.to_bytes(SHARED_STATE_MASK_BYTES, 'little')
+        self.mm[80:128] = dest_mask.to_bytes(SHARED_STATE_MASK_BYTES, 'little')
+        self.sequence += 1  # Even: state is consistent
+        SHARED_STATE_SEQUENCE.pack_into(self.mm, 16, self.sequence)
+
+    def close(self):
+        self.mm.close()
+
+def read_plate_state(buffer, retries=1000, retry_delay=0.0001):
+    """Read a consistent plate state dict from a mapped shared state buffer
+
+    Returns None if nothing has been published yet, or if no consistent state could be
+    read within the retries (e.g. the writer died mid-update).
+    """
+    for _ in range(retries):
+        sequence, = SHARED_STATE_SEQUENCE.unpack_from(buffer, 16)
+        if sequence % 2 == 0:
+            magic, version, plate_type, rows, cols, mode, steps_shown = SHARED_STATE_HEADER.unpack_from(buffer, 0)
+            step, total_steps = SHARED_STATE_STEP.unpack_from(buffer, 24)
+            source_mask = int.from_bytes(buffer[32:80], 'little')
+            dest_mask = int.from_bytes(buffer[80:128], 'little')
+            if SHARED_STATE_SEQUENCE.unpack_from(buffer, 16)[0] == sequence:
+                break
+        time.sleep(retry_delay)  # Writer is mid-update
+    else:
+        return None
+    
+    if magic != SHARED_STATE_MAGIC:
+        return None  # Nothing published yet
+    
+    def mask_wells(mask):
+        return [f"{chr(65 + i // cols)}{i % cols + 1:02d}" for i in range(rows * cols) if mask >> i & 1]
+    
+    return {
+        'sequence': sequence,
+        'plate_type': str(plate_type),
+        'mode': mode,
+        'step': step,
+        'total_steps': total_steps,
+        'steps_shown': steps_shown,
+        'source_wells': mask_wells(source_mask),
+        'destination_wells': mask_wells(dest_mask),
+    }
+
+def get_rss_kb():
+    """Get current resident set size of this process in kB, or None if unavailable (non-Linux)"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return None
 
 class MicroplateGUI(QWidget):
     def __init__(self):
@@ -37,6 +558,8 @@ class MicroplateGUI(QWidget):
         self.currentIndex = 0
         self.plate_type = "384"  # Default to 384-well mode
         self.all_light_mode = False  # All light mode status
+        self.heatmap_mode = False  # Well usage heatmap status
+        self.well_usage = WellUsage()  # Whole-protocol well usage counts
         self.current_csv_file = ""  # Store current CSV file name
         
         # Physical dimension calculation (based on 7-inch screen 16:9 ratio)
@@ -53,25 +576,25 @@ class MicroplateGUI(QWidget):
         
         # 96-well specifications
         self.well_96_diameter_mm = 7.0
-        self.well_96_spacing_mm = 9.0
+        self.well_96_spacing_mm = PLATE_WELL_SPACING_MM["96"]
         self.edge_96_to_first_col_mm = 14.4  # Left edge to column 1 center
         self.edge_96_to_first_row_mm = 11.2  # Top edge to row 1 center
         
         # 24-well specifications
         self.well_24_diameter_mm = 16.5
-        self.well_24_spacing_mm = 19.0
+        self.well_24_spacing_mm = PLATE_WELL_SPACING_MM["24"]
         self.edge_24_to_first_col_mm = 16.4  # Left edge to column 1 center
         self.edge_24_to_first_row_mm = 14.2  # Top edge to row 1 center
         
         # 48-well specifications
         self.well_48_diameter_mm = 10.7
-        self.well_48_spacing_mm = 13.0
+        self.well_48_spacing_mm = PLATE_WELL_SPACING_MM["48"]
         self.edge_48_to_first_col_mm = 18.4  # Left edge to column 1 center
         self.edge_48_to_first_row_mm = 10.2  # Top edge to row 1 center
         
         # 384-well specifications
         self.well_384_diameter_mm = 3.63
-        self.well_384_spacing_mm = 4.50
+        self.well_384_spacing_mm = PLATE_WELL_SPACING_MM["384"]
         self.edge_384_to_first_col_mm = 12.12  # Left edge to column 1 center
         self.edge_384_to_first_row_mm = 8.99   # Top edge to row 1 center
         
@@ -92,12 +615,25 @@ class MicroplateGUI(QWidget):
         # Define plate type cycle order
         self.plate_types = ["384", "96", "48", "24"]
         self.current_plate_index = 0  # Start with 384-well
+        
+        # Batch mode: number of steps shown and advanced at once
+        self.batch_sizes = [1, 2, 4, 8, 16]
+        self.current_batch_index = 0
+        self.batch_size = self.batch_sizes[self.current_batch_index]
 
         # Serial Init
         if not DEV_MODE:
             self.ser_source = serial.Serial(SERIAL_PORT_SOURCE, BAUDRATE)
             self.ser_dest = serial.Serial(SERIAL_PORT_DEST, BAUDRATE)
 
+        # Shared memory publication of the lit-well state
+        self.state_publisher = None
+        if PUBLISH_SHARED_STATE:
+            try:
+                self.state_publisher = PlateStatePublisher()
+            except OSError as e:
+                print(f"Shared plate state disabled: {e}")
+
         # GUI Layout
         main_layout = QHBoxLayout()  # Main horizontal layout
         
@@ -121,6 +657,8 @@ class MicroplateGUI(QWidget):
         self.btn_prev = QPushButton("Previous")
         self.btn_next = QPushButton("Next")
         self.btn_all_light = QPushButton("All Light OFF")
+        self.btn_heatmap = QPushButton("Heatmap OFF")
+        self.btn_batch = QPushButton("Batch 1")
         
         # Set wide rectangular button style for better touch operation
         button_style = """
@@ -152,18 +690,24 @@ class MicroplateGUI(QWidget):
         self.btn_prev.setStyleSheet(self.get_button_style(False))
         self.btn_next.setStyleSheet(self.get_button_style(False))
         self.btn_all_light.setStyleSheet(self.get_button_style(False))
+        self.btn_heatmap.setStyleSheet(self.get_button_style(False))
+        self.btn_batch.setStyleSheet(self.get_button_style(False))
         
         self.btn_plate_type.clicked.connect(self.cycle_plate_type)
         self.btn_select.clicked.connect(self.load_csv)
         self.btn_prev.clicked.connect(self.go_prev)
         self.btn_next.clicked.connect(self.go_next)
         self.btn_all_light.clicked.connect(self.toggle_all_light)
+        self.btn_heatmap.clicked.connect(self.toggle_heatmap)
+        self.btn_batch.clicked.connect(self.cycle_batch_size)
         
         left_panel.addWidget(self.btn_plate_type)
         left_panel.addWidget(self.btn_select)
         left_panel.addWidget(self.btn_prev)
         left_panel.addWidget(self.btn_next)
+        left_panel.addWidget(self.btn_batch)
         left_panel.addWidget(self.btn_all_light)
+        left_panel.addWidget(self.btn_heatmap)
         
         # Right microplate area
         right_panel = QVBoxLayout()
@@ -185,7 +729,15 @@ class MicroplateGUI(QWidget):
         
         self.setLayout(main_layout)
         self.well_buttons = {}
-        
+
+        # Widget pools: plate widgets are created once and reused across redraws
+        self.well_pool = []
+        self.row_label_pool = []
+        self.col_label_pool = []
+        self.plate_outline = None
+        self.size_label = None
+        self.well_style_radius = None  # Border radius the shared well style sheet was built for
+
         # Initialize with empty 384-well plate
         self.draw_plate()
 
@@ -202,29 +754,22 @@ class MicroplateGUI(QWidget):
             self.well_spacing_mm = self.well_96_spacing_mm
             self.edge_to_first_col_mm = self.edge_96_to_first_col_mm
             self.edge_to_first_row_mm = self.edge_96_to_first_row_mm
-            self.rows = 8
-            self.cols = 12
         elif self.plate_type == "48":
             self.well_diameter_mm = self.well_48_diameter_mm
             self.well_spacing_mm = self.well_48_spacing_mm
             self.edge_to_first_col_mm = self.edge_48_to_first_col_mm
             self.edge_to_first_row_mm = self.edge_48_to_first_row_mm
-            self.rows = 6
-            self.cols = 8
         elif self.plate_type == "24":
             self.well_diameter_mm = self.well_24_diameter_mm
             self.well_spacing_mm = self.well_24_spacing_mm
             self.edge_to_first_col_mm = self.edge_24_to_first_col_mm
             self.edge_to_first_row_mm = self.edge_24_to_first_row_mm
-            self.rows = 4
-            self.cols = 6
         else:  # 384-well
             self.well_diameter_mm = self.well_384_diameter_mm
             self.well_spacing_mm = self.well_384_spacing_mm
             self.edge_to_first_col_mm = self.edge_384_to_first_col_mm
             self.edge_to_first_row_mm = self.edge_384_to_first_row_mm
-            self.rows = 16
-            self.cols = 24
+        self.rows, self.cols = PLATE_LAYOUTS.get(self.plate_type, PLATE_LAYOUTS["384"])
             
         # Calculate pixel values
         self.well_diameter_px = int(self.well_diameter_mm * self.mm_to_pixel_x)
@@ -257,6 +802,8 @@ class MicroplateGUI(QWidget):
         # If previously in all light mode, maintain all light state
         if self.all_light_mode:
             self.light_all_wells()
+        elif self.heatmap_mode:
+            self.show_heatmap()
 
     def get_button_style(self, is_active):
         """Get button style, distinguishing selected and unselected states"""
@@ -320,16 +867,9 @@ class MicroplateGUI(QWidget):
             # Store the CSV file name (without path)
             self.current_csv_file = os.path.basename(file_path)
             
-            raw_data = pd.read_csv(file_path)
+            self.csvData = load_protocol(file_path)
+            self.well_usage.reset()
             
-            # Check CSV format and convert
-            if 'Step' in raw_data.columns:
-                # New format: group by Step
-                self.csvData = self.convert_step_format(raw_data)
-            else:
-                # Old format: use directly
-                self.csvData = raw_data
-                
             self.currentIndex = 0
             # If in all light mode, turn off all light mode
             if self.all_light_mode:
@@ -337,168 +877,194 @@ class MicroplateGUI(QWidget):
                 self.btn_all_light.setText("All Light OFF")
                 self.btn_all_light.setStyleSheet(self.get_all_light_button_style(False))
             self.draw_plate()
+            if self.heatmap_mode:
+                self.show_heatmap()
 
-    def convert_step_format(self, raw_data):
-        """Convert Step format CSV to internal format"""
-        converted_data = []
-        
-        # Group by Step
-        for step in sorted(raw_data['Step'].unique()):
-            step_data = raw_data[raw_data['Step'] == step]
-            
-            # Collect all Source and Destination for this step
-            sources = []
-            destinations = []
-            
-            for _, row in step_data.iterrows():
-                # Standardize well format (ensure two digits)
-                source = self.standardize_well_format(str(row['Source']))
-                sources.append(source)
-                
-                if 'Destination' in raw_data.columns and pd.notna(row['Destination']):
-                    dest = self.standardize_well_format(str(row['Destination']))
-                    destinations.append(dest)
-                else:
-                    destinations.append(source)  # If no destination, use source
-            
-            # Connect multiple wells with semicolons
-            source_str = ';'.join(sources)
-            dest_str = ';'.join(destinations)
-            
-            converted_data.append({
-                'Source_well': source_str,
-                'Destination_well': dest_str
-            })
-        
-        return pd.DataFrame(converted_data)
+    def get_well_style_sheet(self):
+        """Get the shared well style sheet, selecting colors by the wellState property"""
+        border_radius = self.well_diameter_px // 2
+        return f"""
+            QPushButton[wellState="idle"] {{
+                border-radius: {border_radius}px;
+                background-color: #000000;
+                border: 1px solid #808080;
+                color: transparent;
+            }}
+            QPushButton[wellState="idle"]:hover {{
+                background-color: #202020;
+                border: 2px solid #A0A0A0;
+            }}
+            QPushButton[wellState="source"] {{
+                border-radius: {border_radius}px;
+                background-color: #FF0000;
+                border: 3px solid #AA0000;
+                color: transparent;
+            }}
+            QPushButton[wellState="source"]:hover {{
+                background-color: #FF3333;
+                border: 3px solid #DD0000;
+            }}
+            QPushButton[wellState="destination"] {{
+                border-radius: {border_radius}px;
+                background-color: #00FF00;
+                border: 3px solid #00AA00;
+                color: transparent;
+            }}
+            QPushButton[wellState="destination"]:hover {{
+                background-color: #33FF33;
+                border: 3px solid #00DD00;
+            }}
+            QPushButton[wellState="batch_source"] {{
+                border-radius: {border_radius}px;
+                background-color: #FF0000;
+                border: 1px solid #AA0000;
+                color: #000000;
+                font-size: {max(border_radius, 6)}px;
+                font-weight: bold;
+                padding: 0px;
+            }}
+            QPushButton[wellState="batch_destination"] {{
+                border-radius: {border_radius}px;
+                background-color: #00FF00;
+                border: 1px solid #00AA00;
+                color: #000000;
+                font-size: {max(border_radius, 6)}px;
+                font-weight: bold;
+                padding: 0px;
+            }}
+            QPushButton[wellState="all_light"] {{
+                border-radius: {border_radius}px;
+                background-color: #FF0000;
+                border: 3px solid #CC0000;
+                color: transparent;
+            }}
+            QPushButton[wellState="all_light"]:hover {{
+                background-color: #FF3333;
+                border: 3px solid #AA0000;
+            }}
+        """ + "".join(
+            f"""
+            QPushButton[wellState="heat_{kind}_{level}"] {{
+                border-radius: {border_radius}px;
+                background-color: #{r * level // HEAT_LEVELS:02X}{g * level // HEAT_LEVELS:02X}{b * level // HEAT_LEVELS:02X};
+                border: 1px solid #{r:02X}{g:02X}{b:02X};
+                color: transparent;
+            }}"""
+            for kind, (r, g, b) in HEAT_COLORS.items()
+            for level in range(1, HEAT_LEVELS + 1)
+        )
 
-    def standardize_well_format(self, well):
-        """Standardize well format to A01 form"""
-        well = well.strip()
-        if len(well) >= 2:
-            row = well[0].upper()
-            col = well[1:]
-            try:
-                col_num = int(col)
-                return f"{row}{col_num:02d}"
-            except ValueError:
-                return well
-        return well
+    def set_well_state(self, btn, state, text=""):
+        """Set well display state (idle, source, destination, batch_*, all_light, heat_*) and text, repolishing only on change"""
+        if btn.text() != text:
+            btn.setText(text)
+        if btn.property("wellState") == state:
+            return
+        btn.setProperty("wellState", state)
+        btn.style().unpolish(btn)
+        btn.style().polish(btn)
+
+    def take_pooled(self, pool, count, factory, container):
+        """Return the first count widgets of pool, creating missing ones and hiding the rest"""
+        while len(pool) < count:
+            widget = factory()
+            widget.setParent(container)
+            pool.append(widget)
+        for widget in pool[count:]:
+            widget.hide()
+        return pool[:count]
 
     def draw_plate(self):
-        # Clear existing widgets
-        for i in reversed(range(self.grid.count())):
-            widget = self.grid.itemAt(i).widget()
-            if widget:
-                widget.deleteLater()
-        
-        self.well_buttons.clear()
-        
-        # Create an absolutely positioned container
         container = self.grid.parent()
         
-        # Clear all existing child elements in container (including plate outline, labels, wells)
-        for child in container.findChildren(QLabel):
-            child.deleteLater()
-        for child in container.findChildren(QPushButton):
-            child.deleteLater()
-        
         # Calculate plate outline position (centered display)
         plate_x = (self.plate_width_px - self.plate_outline_width_px) // 2
         plate_y = (self.plate_height_px - self.plate_outline_height_px) // 2
         
-        # Create plate outline border
-        plate_outline = QLabel("")
-        plate_outline.setFixedSize(self.plate_outline_width_px, self.plate_outline_height_px)
-        plate_outline.setStyleSheet("""
-            QLabel {
-                border: 3px solid #FFFFFF;
-                border-radius: 8px;
-                background-color: #000000;
-            }
-        """)
-        plate_outline.setParent(container)
-        plate_outline.move(plate_x, plate_y)
-        plate_outline.show()
-        
-        # Add plate size label
-        size_label = QLabel(f"127.76mm × 85.48mm")
-        size_label.setAlignment(Qt.AlignCenter)
-        size_label.setFont(QFont("Arial", 8, QFont.Bold))
-        size_label.setStyleSheet("color: #FFFFFF; background: transparent;")
-        size_label.setFixedSize(120, 15)
-        size_label.setParent(container)
-        size_label.move(plate_x + (self.plate_outline_width_px - 120) // 2, plate_y + self.plate_outline_height_px + 5)
-        size_label.show()
+        # Create plate outline border and plate size label once
+        if self.plate_outline is None:
+            self.plate_outline = QLabel("")
+            self.plate_outline.setFixedSize(self.plate_outline_width_px, self.plate_outline_height_px)
+            self.plate_outline.setStyleSheet("""
+                QLabel {
+                    border: 3px solid #FFFFFF;
+                    border-radius: 8px;
+                    background-color: #000000;
+                }
+            """)
+            self.plate_outline.setParent(container)
+            self.plate_outline.move(plate_x, plate_y)
+            self.plate_outline.show()
+            
+            self.size_label = QLabel(f"127.76mm × 85.48mm")
+            self.size_label.setAlignment(Qt.AlignCenter)
+            self.size_label.setFont(QFont("Arial", 8, QFont.Bold))
+            self.size_label.setStyleSheet("color: #FFFFFF; background: transparent;")
+            self.size_label.setFixedSize(120, 15)
+            self.size_label.setParent(container)
+            self.size_label.move(plate_x + (self.plate_outline_width_px - 120) // 2, plate_y + self.plate_outline_height_px + 5)
+            self.size_label.show()
+        
+        # Well styles are shared through the container; rebuild only when the well size changes
+        if self.well_style_radius != self.well_diameter_px // 2:
+            self.well_style_radius = self.well_diameter_px // 2
+            container.setStyleSheet(self.get_well_style_sheet())
         
         # Calculate precise position of first well (A1) (based on edge distance)
         # A1 position = plate start position + edge to first well center distance - well radius
         first_well_x = plate_x + self.edge_to_first_col_px - (self.well_diameter_px // 2)
         first_well_y = plate_y + self.edge_to_first_row_px - (self.well_diameter_px // 2)
         
+        if self.plate_type == "384":
+            font_size = 6
+        elif self.plate_type == "48":
+            font_size = 10
+        elif self.plate_type == "24":
+            font_size = 12
+        else:  # 96-well
+            font_size = 8
+        label_font = QFont("Arial", font_size, QFont.Bold)
+        
+        def make_label():
+            label = QLabel("")
+            label.setAlignment(Qt.AlignCenter)
+            label.setStyleSheet("color: #FFFFFF; background: transparent;")
+            return label
+        
         # Add row labels (A-H or A-P) - based on precise first well position
-        for r in range(self.rows):
-            row_label = QLabel(chr(65 + r))
-            row_label.setAlignment(Qt.AlignCenter)
-            if self.plate_type == "384":
-                font_size = 6
-            elif self.plate_type == "48":
-                font_size = 10
-            elif self.plate_type == "24":
-                font_size = 12
-            else:  # 96-well
-                font_size = 8
-            row_label.setFont(QFont("Arial", font_size, QFont.Bold))
+        row_labels = self.take_pooled(self.row_label_pool, self.rows, make_label, container)
+        for r, row_label in enumerate(row_labels):
+            row_label.setText(chr(65 + r))
+            row_label.setFont(label_font)
             row_label.setFixedSize(15, self.well_diameter_px)
-            row_label.setStyleSheet("color: #FFFFFF; background: transparent;")
-            row_label.setParent(container)
             y_pos = first_well_y + r * self.well_spacing_y_px
             row_label.move(first_well_x - 18, y_pos)
             row_label.show()
         
         # Add column labels (1-12 or 1-24) - based on precise first well position
-        for c in range(self.cols):
-            col_label = QLabel(f"{c+1}")
-            col_label.setAlignment(Qt.AlignCenter)
-            if self.plate_type == "384":
-                font_size = 6
-            elif self.plate_type == "48":
-                font_size = 10
-            elif self.plate_type == "24":
-                font_size = 12
-            else:  # 96-well
-                font_size = 8
-            col_label.setFont(QFont("Arial", font_size, QFont.Bold))
+        col_labels = self.take_pooled(self.col_label_pool, self.cols, make_label, container)
+        for c, col_label in enumerate(col_labels):
+            col_label.setText(f"{c+1}")
+            col_label.setFont(label_font)
             col_label.setFixedSize(self.well_diameter_px, 12)
-            col_label.setStyleSheet("color: #FFFFFF; background: transparent;")
-            col_label.setParent(container)
             x_pos = first_well_x + c * self.well_spacing_x_px
             col_label.move(x_pos, first_well_y - 15)
             col_label.show()
         
-        # Create well buttons (based on precise edge distance calculation)
+        def make_well():
+            btn = QPushButton("")
+            btn.setProperty("wellState", "idle")
+            return btn
+        
+        # Assign pooled well buttons (based on precise edge distance calculation)
+        wells = self.take_pooled(self.well_pool, self.rows * self.cols, make_well, container)
+        self.well_buttons.clear()
         for r in range(self.rows):  # Rows A–H (96) 或 A–P (384)
             for c in range(self.cols):  # Columns 1–12 (96) 或 1–24 (384)
                 well = f"{chr(65 + r)}{c+1:02d}"
-                btn = QPushButton("")
+                btn = wells[r * self.cols + c]
                 btn.setFixedSize(self.well_diameter_px, self.well_diameter_px)
                 btn.setToolTip(well)
-                btn.setParent(container)
-                
-                # Set circular style
-                border_radius = self.well_diameter_px // 2
-                btn.setStyleSheet(f"""
-                    QPushButton {{
-                        border-radius: {border_radius}px;
-                        background-color: #000000;
-                        border: 1px solid #808080;
-                        color: transparent;
-                    }}
-                    QPushButton:hover {{
-                        background-color: #202020;
-                        border: 2px solid #A0A0A0;
-                    }}
-                """)
                 
                 # Calculate precise position (based on edge distance and well spacing)
                 x_pos = first_well_x + c * self.well_spacing_x_px
@@ -511,115 +1077,65 @@ class MicroplateGUI(QWidget):
         self.update_highlight()
 
     def update_highlight(self):
-        # Calculate dynamic border radius
-        border_radius = self.well_diameter_px // 2
+        # Work out the target state of every well, then only touch wells whose state changes
+        states = dict.fromkeys(self.well_buttons, ("idle", ""))
         
-        # Reset all button styles to default circular style
-        default_style = f"""
-            QPushButton {{
-                border-radius: {border_radius}px;
-                background-color: #000000;
-                border: 1px solid #808080;
-                color: transparent;
-            }}
-            QPushButton:hover {{
-                background-color: #202020;
-                border: 2px solid #A0A0A0;
-            }}
-        """
-        for btn in self.well_buttons.values():
-            btn.setStyleSheet(default_style)
-            
         if not self.csvData.empty:
-            src_wells_str = str(self.csvData.at[self.currentIndex, 'Source_well'])
-            
-            # Check if Destination_well column exists
-            if 'Destination_well' in self.csvData.columns:
-                dest_wells_str = str(self.csvData.at[self.currentIndex, 'Destination_well'])
-            else:
-                dest_wells_str = src_wells_str  # If no destination, use source
-            
-            # Split multiple wells (support semicolon separation)
-            src_wells = [w.strip() for w in src_wells_str.split(';') if w.strip()]
-            dest_wells = [w.strip() for w in dest_wells_str.split(';') if w.strip()]
-            
-            # Source wells style (red, bright and prominent)
-            src_style = f"""
-                QPushButton {{
-                    border-radius: {border_radius}px;
-                    background-color: #FF0000;
-                    border: 3px solid #AA0000;
-                    color: transparent;
-                }}
-                QPushButton:hover {{
-                    background-color: #FF3333;
-                    border: 3px solid #DD0000;
-                }}
-            """
-            
-            # Destination wells style (green, bright and prominent)
-            dest_style = f"""
-                QPushButton {{
-                    border-radius: {border_radius}px;
-                    background-color: #00FF00;
-                    border: 3px solid #00AA00;
-                    color: transparent;
-                }}
-                QPushButton:hover {{
-                    background-color: #33FF33;
-                    border: 3px solid #00DD00;
-                }}
-            """
+            # Steps shown at once: the current step, or the next batch_size steps in batch mode
+            last_index = min(self.currentIndex + self.batch_size, len(self.csvData))
+            steps = split_step_wells(self.csvData.iloc[self.currentIndex:last_index].reset_index(drop=True))
+            batch = self.batch_size > 1
             
-            # If source and destination are the same well, use red style (same as source)
-            mixed_style = f"""
-                QPushButton {{
-                    border-radius: {border_radius}px;
-                    background-color: #FF0000;
-                    border: 3px solid #AA0000;
-                    color: transparent;
-                }}
-                QPushButton:hover {{
-                    background-color: #FF3333;
-                    border: 3px solid #DD0000;
-                }}
-            """
-            
-            # First mark all destination wells
-            dest_wells_set = set(dest_wells)
-            for dest in dest_wells:
-                if dest in self.well_buttons:
-                    self.well_buttons[dest].setStyleSheet(dest_style)
-                    self.send_command(dest, "destination")
-            
-            # Then mark source wells, if overlapping with destination use mixed style
-            for src in src_wells:
-                if src in self.well_buttons:
-                    if src in dest_wells_set:
-                        # Source and destination are the same well, use red style
-                        self.well_buttons[src].setStyleSheet(mixed_style)
-                    else:
-                        # Pure source well - check if this is source-only mode
-                        if 'Destination_well' not in self.csvData.columns or set(src_wells) == set(dest_wells):
-                            # Source only mode, use red (same as source style)
-                            self.well_buttons[src].setStyleSheet(src_style)
-                        else:
-                            # Normal source with different destination, use red
-                            self.well_buttons[src].setStyleSheet(src_style)
-                    self.send_command(src, "source")
+            # Mark later steps first so wells used by several steps show the earliest step number
+            for number, (src_wells, dest_wells) in reversed(list(enumerate(steps, start=1))):
+                text = str(number) if batch else ""
+                
+                # First mark all destination wells (green)
+                for dest in dest_wells:
+                    if dest in self.well_buttons:
+                        states[dest] = ("batch_destination" if batch else "destination", text)
+                
+                # Then mark source wells (red); a well that is both source and destination stays red
+                for src in src_wells:
+                    if src in self.well_buttons:
+                        states[src] = ("batch_source" if batch else "source", text)
             
+            # Combined panel state for all shown steps, sent to the hardware in one update
+            commands = []
+            for src_wells, dest_wells in steps:
+                commands.extend((dest, "destination") for dest in dest_wells if dest in self.well_buttons)
+                commands.extend((src, "source") for src in src_wells if src in self.well_buttons)
+            commands = list(dict.fromkeys(commands))
+            self.send_commands(commands)
+            self.publish_state(
+                [well for well, t in commands if t == "source"],
+                [well for well, t in commands if t == "destination"],
+                steps_shown=len(steps)
+            )
+        else:
+            self.publish_state([], [])
+        
+        for well, (state, text) in states.items():
+            self.set_well_state(self.well_buttons[well], state, text)
+        
+        if not self.csvData.empty:
             # Update label display - show CSV file name and step information
+            if last_index - self.currentIndex > 1:
+                step_text = f"Steps {self.currentIndex + 1}-{last_index}/{len(self.csvData)}"
+            else:
+                step_text = f"Step {self.currentIndex + 1}/{len(self.csvData)}"
             if self.current_csv_file:
-                self.label.setText(f"File: {self.current_csv_file}\nStep {self.currentIndex + 1}/{len(self.csvData)}")
+                self.label.setText(f"File: {self.current_csv_file}\n{step_text}")
             else:
-                self.label.setText(f"Step {self.currentIndex + 1}/{len(self.csvData)}")
+                self.label.setText(step_text)
 
     def toggle_all_light(self):
         """Toggle all light mode"""
         self.all_light_mode = not self.all_light_mode
         
         if self.all_light_mode:
-            # Turn on all light mode
+            # Turn on all light mode (replaces heatmap display)
+            self.exit_heatmap_mode()
             self.light_all_wells()
             self.btn_all_light.setText("All Light ON")
             self.btn_all_light.setStyleSheet(self.get_all_light_button_style(True))
@@ -660,26 +1176,9 @@ class MicroplateGUI(QWidget):
 
     def light_all_wells(self):
         """Light up all wells"""
-        # Calculate dynamic border radius
-        border_radius = self.well_diameter_px // 2
-        
-        # All light style (red, bright and prominent)
-        all_light_style = f"""
-            QPushButton {{
-                border-radius: {border_radius}px;
-                background-color: #FF0000;
-                border: 3px solid #CC0000;
-                color: transparent;
-            }}
-            QPushButton:hover {{
-                background-color: #FF3333;
-                border: 3px solid #AA0000;
-            }}
-        """
-        
-        # Apply all light style to all well buttons
+        # Apply all light state (red, bright and prominent) to all well buttons
         for btn in self.well_buttons.values():
-            btn.setStyleSheet(all_light_style)
+            self.set_well_state(btn, "all_light")
             
         # Update label display
         total_wells = self.rows * self.cols
@@ -688,6 +1187,9 @@ class MicroplateGUI(QWidget):
         else:
             self.label.setText(f"All Light Mode\nTotal {total_wells} wells")
         
+        all_wells = list(self.well_buttons)
+        self.publish_state(all_wells, all_wells, SHARED_STATE_MODE_ALL_LIGHT)
+        
         # Send all light command (will display in terminal in dev mode)
         if not DEV_MODE:
             # Here can send special all light command to hardware
@@ -706,21 +1208,9 @@ class MicroplateGUI(QWidget):
             self.update_highlight()
         else:
             # If no CSV loaded, return to default style
-            border_radius = self.well_diameter_px // 2
-            default_style = f"""
-                QPushButton {{
-                    border-radius: {border_radius}px;
-                    background-color: #000000;
-                    border: 1px solid #808080;
-                    color: transparent;
-                }}
-                QPushButton:hover {{
-                    background-color: #202020;
-                    border: 2px solid #A0A0A0;
-                }}
-            """
             for btn in self.well_buttons.values():
-                btn.setStyleSheet(default_style)
+                self.set_well_state(btn, "idle")
+            self.publish_state([], [])
             
             # Restore label display
             if self.current_csv_file:
@@ -738,15 +1228,77 @@ class MicroplateGUI(QWidget):
         else:
             print(f"[DEV] Turn off all light mode ({self.plate_type}-well)")
 
-    def send_command(self, well, panel_type):
+    def toggle_heatmap(self):
+        """Toggle whole-protocol well usage heatmap"""
+        self.heatmap_mode = not self.heatmap_mode
+        
+        if self.heatmap_mode:
+            # Turn on heatmap; the overlay is on screen only, so all light is switched
+            # off first and the hardware goes back to showing the current step
+            if self.all_light_mode:
+                self.all_light_mode = False
+                self.btn_all_light.setText("All Light OFF")
+                self.btn_all_light.setStyleSheet(self.get_all_light_button_style(False))
+                self.turn_off_all_wells()
+            self.show_heatmap()
+            self.btn_heatmap.setText("Heatmap ON")
+            self.btn_heatmap.setStyleSheet(self.get_button_style(True))
+        else:
+            # Turn off heatmap, return to current step highlight state
+            self.update_highlight()
+            self.btn_heatmap.setText("Heatmap OFF")
+            self.btn_heatmap.setStyleSheet(self.get_button_style(False))
+
+    def exit_heatmap_mode(self):
+        """Leave heatmap mode and reset its button (the caller redraws the wells)"""
+        if self.heatmap_mode:
+            self.heatmap_mode = False
+            self.btn_heatmap.setText("Heatmap OFF")
+            self.btn_heatmap.setStyleSheet(self.get_button_style(False))
+
+    def show_heatmap(self):
+        """Show per-well usage over the whole protocol as an on-screen intensity overlay (hardware keeps the current step)"""
+        if self.csvData.empty:
+            return
+        
+        # Only steps appended since the last call are counted
+        self.well_usage.update(self.csvData)
+        wells = list(self.well_buttons)
+        src = self.well_usage.source_counts.reindex(wells, fill_value=0).to_numpy()
+        dest = self.well_usage.destination_counts.reindex(wells, fill_value=0).to_numpy()
+        total = src + dest
+        levels = np.ceil(HEAT_LEVELS * total / max(total.max(), 1)).astype(int)
+        
+        for well, s, d, level in zip(wells, src, dest, levels):
+            if level == 0:
+                state = "idle"
+            elif d == 0:
+                state = f"heat_source_{level}"
+            elif s == 0:
+                state = f"heat_destination_{level}"
+            else:
+                state = f"heat_both_{level}"
+            self.set_well_state(self.well_buttons[well], state)
+        
+        # Update label display
+        used_wells = int((total > 0).sum())
+        if self.current_csv_file:
+            self.label.setText(f"File: {self.current_csv_file}\nUsage Heatmap\n{self.well_usage.steps} steps, {used_wells} wells")
+        else:
+            self.label.setText(f"Usage Heatmap\n{self.well_usage.steps} steps, {used_wells} wells")
+
+    def format_command(self, well, panel_type):
         row = well[0]
         col = well[1:].zfill(2)
         if panel_type == "all_light":
-            command = f"all_light <{row},{col},S,>"
+            return f"all_light <{row},{col},S,>"
         elif panel_type == "turn_off":
-            command = f"turn_off <{row},{col},S,>"
+            return f"turn_off <{row},{col},S,>"
         else:
-            command = f"{panel_type} <{row},{col},S,>"
+            return f"{panel_type} <{row},{col},S,>"
+
+    def send_command(self, well, panel_type):
+        command = self.format_command(well, panel_type)
             
         if not DEV_MODE:
             port = self.ser_source if panel_type == "source" else self.ser_dest
@@ -754,25 +1306,190 @@ class MicroplateGUI(QWidget):
         else:
             print(f"[DEV] 送出指令：{command}")
 
+    def send_commands(self, commands):
+        """Send (well, panel_type) commands with one combined write per serial port"""
+        source_commands = [self.format_command(well, t) for well, t in commands if t == "source"]
+        dest_commands = [self.format_command(well, t) for well, t in commands if t != "source"]
+        
+        if not DEV_MODE:
+            if source_commands:
+                self.ser_source.write(bytes("".join(source_commands), 'us-ascii'))
+            if dest_commands:
+                self.ser_dest.write(bytes("".join(dest_commands), 'us-ascii'))
+        else:
+            for well, panel_type in commands:
+                print(f"[DEV] 送出指令：{self.format_command(well, panel_type)}")
+
+    def publish_state(self, source_wells, dest_wells, mode=SHARED_STATE_MODE_STEPS, steps_shown=1):
+        """Publish the current lit-well state to shared memory for external consumers"""
+        if self.state_publisher is None:
+            return
+        step = self.currentIndex + 1 if not self.csvData.empty else 0
+        self.state_publisher.publish(self.plate_type, step, len(self.csvData),
+                                     source_wells, dest_wells, mode, steps_shown)
+
     def go_next(self):
-        if not self.csvData.empty and self.currentIndex < len(self.csvData) - 1:
-            self.currentIndex += 1
+        if not self.csvData.empty and self.currentIndex + self.batch_size < len(self.csvData):
+            self.currentIndex += self.batch_size
+            # Stepping shows step colors, so the heatmap overlay is turned off
+            self.exit_heatmap_mode()
             self.update_highlight()
 
     def go_prev(self):
         if not self.csvData.empty and self.currentIndex > 0:
-            self.currentIndex -= 1
+            self.currentIndex = max(self.currentIndex - self.batch_size, 0)
+            # Stepping shows step colors, so the heatmap overlay is turned off
+            self.exit_heatmap_mode()
+            self.update_highlight()
+
+    def cycle_batch_size(self):
+        """Cycle through the number of steps shown and advanced at once"""
+        self.current_batch_index = (self.current_batch_index + 1) % len(self.batch_sizes)
+        self.batch_size = self.batch_sizes[self.current_batch_index]
+        self.btn_batch.setText(f"Batch {self.batch_size}")
+        self.btn_batch.setStyleSheet(self.get_button_style(self.batch_size > 1))
+        
+        # Redraw current steps unless all light or heatmap display is active
+        if not self.csvData.empty and not self.all_light_mode and not self.heatmap_mode:
             self.update_highlight()
 
+    def run_soak_test(self, iterations=1000, steps_per_plate=20, report_every=100):
+        """Cycle plate types and protocol steps repeatedly, reporting RSS and object counts
+
+        Only allowed in DEV_MODE, so no synthetic steps reach the serial ports. Shared state
+        publication is paused for the run so consumers never see the synthetic protocol.
+        """
+        if not DEV_MODE:
+            raise RuntimeError("Soak test only runs with DEV_MODE = True")
+        app = QApplication.instance()
+        state_publisher, self.state_publisher = self.state_publisher, None
+        try:
+            self.soak_plate_cycles(app, iterations, steps_per_plate, report_every)
+        finally:
+            self.state_publisher = state_publisher
+
+    def soak_plate_cycles(self, app, iterations, steps_per_plate, report_every):
+        """Soak test loop (see run_soak_test)"""
+        # Synthetic protocol per plate type: one well per step, destination is the next well
+        protocols = {}
+        for plate_type in self.plate_types:
+            self.switch_plate_type(plate_type)
+            wells = list(self.well_buttons)
+            protocols[plate_type] = pd.DataFrame({
+                'Source_well': wells,
+                'Destination_well': wells[1:] + wells[:1]
+            })
+        
+        print(f"[SOAK] {iterations} iterations, {steps_per_plate} steps per plate")
+        print("[SOAK] iteration  rss_kb  widgets  py_objects")
+        with open(os.devnull, 'w') as devnull:
+            for i in range(1, iterations + 1):
+                # Silence per-step [DEV] command output while cycling
+                with contextlib.redirect_stdout(devnull):
+                    self.cycle_plate_type()
+                    # Simulate loading a file for the new plate type
+                    self.csvData = protocols[self.plate_type]
+                    self.currentIndex = 0
+                    self.draw_plate()
+                    for _ in range(min(steps_per_plate, len(self.csvData) - 1)):
+                        self.go_next()
+                    app.processEvents()
+                
+                if i % report_every == 0 or i == iterations:
+                    gc.collect()
+                    rss_kb = get_rss_kb()
+                    rss_text = str(rss_kb) if rss_kb is not None else "n/a"
+                    print(f"[SOAK] {i:9d}  {rss_text:>6s}  {len(QApplication.allWidgets()):7d}  {len(gc.get_objects()):10d}")
+
     def closeEvent(self, event):
         if not DEV_MODE:
             self.ser_source.close()
             self.ser_dest.close()
+        if self.state_publisher is not None:
+            self.state_publisher.close()
         print("Close program and serial connection!")
         event.accept()
 
+def positive_int(value):
+    """argparse type for integers greater than zero"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+    return number
+
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Microplate Light Guide")
+    parser.add_argument('--soak', type=int, metavar='N',
+                        help="Run N soak-test iterations (plate type and step cycling) and exit")
+    parser.add_argument('--lint', metavar='DIR',
+                        help="Check all protocol CSVs in DIR in parallel and exit")
+    parser.add_argument('--optimize', metavar='CSV',
+                        help="Reorder independent steps of a protocol to minimize panel changes, export and exit")
+    parser.add_argument('--output', metavar='CSV',
+                        help="Output file for --optimize (default: <name>_optimized.csv)")
+    parser.add_argument('--plate', choices=list(PLATE_LAYOUTS),
+                        help="Plate type to check wells against (default: smallest plate that fits)")
+    parser.add_argument('--jobs', type=positive_int, metavar='N',
+                        help="Number of lint worker processes (default: CPU count)")
+    args, qt_args = parser.parse_known_args()
+    
+    if args.optimize:
+        try:
+            data = load_protocol(args.optimize)
+        except Exception as e:
+            print(f"Cannot optimize {args.optimize}: cannot parse: {e}")
+            sys.exit(1)
+        if 'Source_well' not in data.columns:
+            print(f"Cannot optimize {args.optimize}: missing Step/Source columns")
+            sys.exit(1)
+        steps = split_step_wells(data)
+        positions = [p for p in (parse_well(w) for src_wells, dest_wells in steps for w in src_wells + dest_wells) if p]
+        plate_type = args.plate or infer_plate_type(positions)
+        try:
+            optimized, order = optimize_step_order(data, plate_type)
+        except ValueError as e:
+            print(f"Cannot optimize {args.optimize}: {e}")
+            sys.exit(1)
+        lit = step_well_matrix(steps, plate_type)
+        before = transition_costs(lit, list(range(len(data))), plate_type)
+        after = transition_costs(lit, order, plate_type)
+        output = args.output or os.path.splitext(args.optimize)[0] + "_optimized.csv"
+        export_protocol(optimized, output)
+        print(f"{len(data)} steps ({plate_type}-well): changed wells {before[0]} -> {after[0]}, "
+              f"travel {before[1]:.1f}mm -> {after[1]:.1f}mm")
+        print(f"Saved to {output}")
+        sys.exit(0)
+    
+    if args.lint:
+        if not os.path.isdir(args.lint):
+            print(f"Cannot lint {args.lint}: not a directory")
+            sys.exit(1)
+        results = lint_directory(args.lint, args.plate, args.jobs)
+        for result in results:
+            status = "FAIL" if result['errors'] else "OK"
+            plate = f"{result['plate_type']}-well" if result['plate_type'] else "unknown plate"
+            print(f"{status:4s}  {os.path.basename(result['file'])}: {result['steps']} steps, "
+                  f"max {result['max_wells']} wells/step, {plate}")
+            for error in result['errors'][:10]:
+                print(f"      {error}")
+            if len(result['errors']) > 10:
+                print(f"      ... and {len(result['errors']) - 10} more")
+        failed = sum(1 for result in results if result['errors'])
+        print(f"{len(results)} files checked, {failed} failed")
+        sys.exit(1 if failed else 0)
+    
+    if args.soak and not DEV_MODE:
+        print("Soak test refused: set DEV_MODE = True so no test steps are sent to the serial ports")
+        sys.exit(1)
+    
+    app = QApplication(sys.argv[:1] + qt_args)
     window = MicroplateGUI()
+    if args.soak:
+        window.show()
+        window.run_soak_test(args.soak)
+        sys.exit(0)
     window.showFullScreen()  # Use Qt5's built-in fullscreen method
     sys.exit(app.exec_())